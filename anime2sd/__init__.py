@@ -1,4 +1,8 @@
-from .common_preprocess import rearrange_related_files, load_metadata_from_aux
+from .common_preprocess import (
+    rearrange_related_files,
+    rearrange_related_files_once,
+    load_metadata_from_aux,
+)
 from .download import download_animes, download_images
 from .extract_frames import extract_and_remove_similar
 from .remove_duplicates import DuplicateRemover
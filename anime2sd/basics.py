@@ -142,7 +142,11 @@ def remove_empty_folders(path_abs):
 
 def get_images_recursively(folder_path):
     """
-    Get all images recursively from a folder using Path and rglob.
+    Get all images recursively from a folder.
+
+    The folder is walked only once, listing directories without calling stat
+    on each file. As with globbing one extension after another, images are
+    grouped by extension and follow the walk order within each group.
 
     Args:
     - folder_path (str): The path to the folder.
@@ -150,18 +154,16 @@ def get_images_recursively(folder_path):
     Returns:
     - list: A list of image paths.
     """
-    allowed_patterns = [
-        "*.[Pp][Nn][Gg]",
-        "*.[Jj][Pp][Gg]",
-        "*.[Jj][Pp][Ee][Gg]",
-        "*.[Ww][Ee][Bb][Pp]",
-        "*.[Gg][Ii][Ff]",
-    ]
+    image_path_lists = {ext: [] for ext in [".png", ".jpg", ".jpeg", ".webp", ".gif"]}
+
+    for root, _, filenames in os.walk(str(Path(folder_path))):
+        for filename in filenames:
+            ext = os.path.splitext(filename)[1].lower()
+            if ext in image_path_lists:
+                image_path_lists[ext].append(os.path.join(root, filename))
 
     image_path_list = [
-        str(path)
-        for pattern in allowed_patterns
-        for path in Path(folder_path).rglob(pattern)
+        path for path_list in image_path_lists.values() for path in path_list
     ]
 
     return image_path_list
@@ -183,7 +183,7 @@ def tag_and_caption_from_directory(
     caption_generator: CaptionGenerator,
     save_aux: List[str],
     logger: Optional[logging.Logger] = None,
-):
+) -> List[str]:
     """
     Processes images in a directory for tagging and captioning.
 
@@ -204,12 +204,17 @@ def tag_and_caption_from_directory(
             List of auxiliary attributes to save.
         logger (Logger):
             Logger for logging. Defaults to None, which uses the default logger.
+
+    Returns:
+        List[str]:
+            Paths of the processed images, which can be passed to later processing
+            of the same directory to avoid scanning it again.
     """
     if logger is None:
         logger = logging.getLogger()
 
-    source = LocalSource(dir)
-    source = source.attach(
+    local_source = LocalSource(dir)
+    source = local_source.attach(
         tagging_manager.get_tagging_action(),
         # Maybe it makes more sense to deal with process_from_original_tags here
         tagging_manager.get_tag_removing_underscore_action(),
@@ -234,6 +239,7 @@ def tag_and_caption_from_directory(
                 in_place=True,
             )
         )
+    return [path for path, _ in local_source.file_list]
 
 
 def compute_and_save_core_tags(
@@ -314,6 +320,7 @@ def tag_and_caption_from_directory_core_final(
     tagging_manager: TaggingManager,
     caption_generator: CaptionGenerator,
     save_aux: List[str],
+    image_paths: Optional[List[str]] = None,
     logger: Optional[logging.Logger] = None,
 ):
     """
@@ -330,13 +337,17 @@ def tag_and_caption_from_directory_core_final(
             The caption generator for generating captions.
         save_aux (list):
             List of auxiliary attributes to save.
+        image_paths (Optional[List[str]]):
+            Paths of the images in the directory, as returned by
+            tag_and_caption_from_directory. Defaults to None, in which case
+            the directory is scanned.
         logger (Logger):
             Logger for logging. Defaults to None, which uses the default logger.
     """
     if logger is None:
         logger = logging.getLogger()
 
-    source = LocalSource(dir)
+    source = LocalSource(dir, image_paths=image_paths)
     core_tag_processor = CoreTagProcessor(
         core_tag_path=core_tag_path,
         logger=logger,
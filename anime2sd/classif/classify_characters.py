@@ -1,4 +1,6 @@
+import os
 import logging
+import threading
 from typing import List, Tuple, Dict, Optional
 from hbutils.string import plural_word
 
@@ -20,6 +22,16 @@ from .merge_clusters import (
 )
 
 
+_ref_dir_locks = {}
+_ref_dir_locks_lock = threading.Lock()
+
+
+def _get_ref_dir_lock(ref_dir: str) -> threading.Lock:
+    """Get the lock protecting the feature extraction of a reference directory."""
+    with _ref_dir_locks_lock:
+        return _ref_dir_locks.setdefault(os.path.abspath(ref_dir), threading.Lock())
+
+
 def cluster_characters_basics(
     images: np.ndarray,
     clu_min_samples: int = 5,
@@ -332,13 +344,17 @@ def classify_from_directory(
     ref_images, ref_labels = None, None
 
     if ref_dir is not None:
-        ref_image_files, ref_labels_tmp, ref_characters = parse_ref_dir(ref_dir)
+        # Pipelines sharing the reference directory compute its features only once,
+        # the others wait and load them from the ccip cache
+        with _get_ref_dir_lock(ref_dir):
+            ref_image_files, ref_labels_tmp, ref_characters = parse_ref_dir(ref_dir)
+            if ref_image_files:
+                ref_images = load_image_features_and_characters(
+                    image_files=ref_image_files,
+                    tqdm_desc="Extract reference features",
+                    logger=logger,
+                )[1]
         if ref_image_files:
-            ref_images = load_image_features_and_characters(
-                image_files=ref_image_files,
-                tqdm_desc="Extract reference features",
-                logger=logger,
-            )[1]
             ref_labels = ref_labels_tmp
             # Merge class names and update ref_labels and characters_per_image
             character_mapping, ref_labels, characters_per_image = merge_characters(
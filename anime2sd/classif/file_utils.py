@@ -8,7 +8,7 @@ from natsort import natsorted
 from hbutils.string import plural_word
 
 import numpy as np
-from imgutils.metrics import ccip_extract_feature
+from imgutils.metrics import ccip_batch_extract_features
 
 from ..basics import (
     get_images_recursively,
@@ -25,6 +25,7 @@ def load_image_features_and_characters(
     image_files: Optional[List[str]] = None,
     save_ccip_cache: bool = True,
     tqdm_desc: Optional[str] = None,
+    batch_size: int = 16,
     logger: Optional[logging.Logger] = None,
 ) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray], Dict[int, Character]]:
     """Load image features and associated character information
@@ -41,6 +42,9 @@ def load_image_features_and_characters(
             Whether to save the extracted image features to a cache file.
         tqdm_desc (Optional[str]):
             A description of the progress bar.
+        batch_size (int):
+            The number of images whose features are extracted together
+            when they are not cached.
         logger (Optional[Logger]):
             A logger to use for logging. Defaults to None, in which case
             the default logger will be used.
@@ -66,22 +70,20 @@ def load_image_features_and_characters(
         image_files = np.array(natsorted(get_images_recursively(src_dir)))
     logger.info(f'Extracting feature of {plural_word(len(image_files), "image")} ...')
 
-    images = []
+    images = [None] * len(image_files)
+    to_extract = []  # Indices of images whose features are not cached
     characters_list = []
     character_to_index = {}  # Mapping from character name to label index
     index_to_character = {}  # Mapping from label index to character name
     label_counter = 0
 
-    # Iterate over image files to extract features and metadata
-    for img_path in tqdm(image_files, desc=tqdm_desc):
+    # Iterate over image files to load cached features and metadata
+    for i, img_path in enumerate(tqdm(image_files, desc=tqdm_desc)):
         ccip_path, _ = get_corr_ccip_names(img_path)
         if os.path.exists(ccip_path):
-            images.append(np.load(ccip_path))
+            images[i] = np.load(ccip_path)
         else:
-            img_embedding = ccip_extract_feature(img_path)
-            images.append(img_embedding)
-            if save_ccip_cache:
-                np.save(ccip_path, img_embedding)
+            to_extract.append(i)
 
         meta_path, _ = get_corr_meta_names(img_path)
         characters = []
@@ -98,6 +100,21 @@ def load_image_features_and_characters(
                         characters.append(character_to_index[character])
         characters_list.append(characters)
 
+    # Extract the remaining features by batch
+    if to_extract:
+        with tqdm(total=len(to_extract), desc=tqdm_desc) as pbar:
+            for k in range(0, len(to_extract), batch_size):
+                indices = to_extract[k : k + batch_size]
+                img_embeddings = ccip_batch_extract_features(
+                    [image_files[i] for i in indices]
+                )
+                for i, img_embedding in zip(indices, img_embeddings):
+                    images[i] = img_embedding
+                    if save_ccip_cache:
+                        ccip_path, _ = get_corr_ccip_names(image_files[i])
+                        np.save(ccip_path, img_embedding)
+                pbar.update(len(indices))
+
     images = np.array(images)
 
     # Initialize characters_per_image only if there are characters found
@@ -2,6 +2,7 @@ import os
 import json
 import shutil
 import logging
+import threading
 from tqdm import tqdm
 from typing import List, Dict, Optional
 
@@ -43,6 +44,9 @@ def rearrange_related_files(src_dir: str, logger: Optional[logging.Logger] = Non
     if logger is None:
         logger = logging.getLogger()
     all_files = construct_file_list(src_dir)
+    # Check existence against the listing instead of calling stat for each file
+    # (multiply.txt may be dropped from all_files but is never a related file)
+    existing_paths = set(os.path.normpath(path) for path in all_files.values())
     image_files = get_images_recursively(src_dir)
 
     logger.info("Arranging related files ...")
@@ -50,7 +54,7 @@ def rearrange_related_files(src_dir: str, logger: Optional[logging.Logger] = Non
         related_paths = get_related_paths(img_path)
         for related_path in related_paths:
             # If the related file does not exist in the expected location
-            if not os.path.exists(related_path):
+            if os.path.normpath(related_path) not in existing_paths:
                 # Search for the file in the all_files dictionary
                 found_path = all_files.get(os.path.basename(related_path))
                 if found_path is None:
@@ -67,6 +71,38 @@ def rearrange_related_files(src_dir: str, logger: Optional[logging.Logger] = Non
                     )
 
 
+# Directories already rearranged in this process with their modification time
+_rearranged_dirs = {}
+_rearranged_dirs_locks = {}
+_rearranged_dirs_lock = threading.Lock()
+
+
+def rearrange_related_files_once(
+    src_dir: str, logger: Optional[logging.Logger] = None
+):
+    """
+    Rearrange related files in some directory unless this was already done
+    in this process and the modification time of the directory has not changed.
+    Calls on the same directory from different threads are serialized.
+
+    Args:
+        src_dir (src): The directory containing images and other files to rearrange.
+        logger (Logger): A logger to use for logging.
+    """
+    if logger is None:
+        logger = logging.getLogger()
+    src_dir = os.path.abspath(src_dir)
+    with _rearranged_dirs_lock:
+        dir_lock = _rearranged_dirs_locks.setdefault(src_dir, threading.Lock())
+    with dir_lock:
+        if _rearranged_dirs.get(src_dir) == os.stat(src_dir).st_mtime_ns:
+            logger.info(f"Related files of {src_dir} are already arranged")
+            return
+        rearrange_related_files(src_dir, logger)
+        # Rearranging may itself modify the directory
+        _rearranged_dirs[src_dir] = os.stat(src_dir).st_mtime_ns
+
+
 def load_metadata_from_aux(
     src_dir: str,
     load_grabber_ext: Optional[str],
@@ -1,12 +1,17 @@
 import os
 import logging
+import functools
 import argparse
+import threading
 from datetime import datetime
 
 
+@functools.lru_cache(maxsize=None)
 def setup_logging(log_dir: str, log_prefix: str, logger_name: str):
     """
     Set up logging to file and stdout with specified directory and prefix.
+    Calling again with the same arguments returns the same logger without
+    reopening its handlers.
 
     Args:
         log_dir (str): Directory to save the log file.
@@ -45,6 +50,11 @@ def setup_logging(log_dir: str, log_prefix: str, logger_name: str):
     return logger
 
 
+# Destination directories already created in this process
+_created_dirs = set()
+_created_dirs_lock = threading.Lock()
+
+
 def get_and_create_dst_dir(
     args: argparse.Namespace,
     mode: str,
@@ -56,6 +66,7 @@ def get_and_create_dst_dir(
     and additional arguments.
 
     If 'makedirs' is True, the function also creates the directory if it doesn't exist.
+    Each directory is only created once per process.
 
     Args:
         args (argparse.Namespace):
@@ -74,9 +85,14 @@ def get_and_create_dst_dir(
     dst_dir = os.path.join(
         args.dst_dir, mode, args.extra_path_component, args.image_type, sub_dir
     ).rstrip(os.path.sep)
+    dst_dir = os.path.abspath(dst_dir)
     if makedirs:
-        os.makedirs(dst_dir, exist_ok=True)
-    return os.path.abspath(dst_dir)
+        # Directories are created from multiple threads
+        with _created_dirs_lock:
+            if dst_dir not in _created_dirs:
+                os.makedirs(dst_dir, exist_ok=True)
+                _created_dirs.add(dst_dir)
+    return dst_dir
 
 
 def get_src_dir(args, stage):
@@ -94,6 +110,9 @@ def get_src_dir(args, stage):
     Raises:
         ValueError: If the provided stage number is invalid.
     """
+    stage_src_dirs = getattr(args, "stage_src_dirs", None)
+    if stage_src_dirs is not None and stage in stage_src_dirs:
+        return stage_src_dirs[stage]
     if stage == args.start_stage:
         return os.path.abspath(args.src_dir)
     elif stage == 1:
@@ -130,6 +149,21 @@ def get_src_dir(args, stage):
         raise ValueError(f"Invalid stage: {stage}")
 
 
+def cache_src_dirs(args):
+    """
+    Compute the source directories of all the stages once and store them in
+    args.stage_src_dirs, where they are looked up by `get_src_dir`.
+    This should be called once the arguments are no longer modified.
+
+    Args:
+        args (argparse.Namespace):
+            The namespace object containing the command-line arguments.
+    """
+    args.stage_src_dirs = None
+    stages = [args.start_stage, *range(1, 8), "core_tag"]
+    args.stage_src_dirs = {stage: get_src_dir(args, stage) for stage in stages}
+
+
 def is_parent_path(path1, path2, both_sides=False):
     parent = os.path.commonpath([path1, path2])
     is_parent = parent == path1
@@ -142,8 +176,21 @@ class ExecutionConfig(object):
     """
     Utilities to order the execution of multiple pipelines when
     multiple configuration files are given.
+
+    Each step of a pipeline (a stage number, or one of the phases of stage 5)
+    is a node of the execution graph, and its incoming edges are given by
+    `get_dependencies`.
     """
 
+    # The event of the dependent pipelines that a step needs to wait for
+    DEPENDENCY_EVENTS = {
+        3: 3,
+        "save_core": "5_phase1",
+        "5_final": "save_core",
+        6: 5,
+        7: 6,
+    }
+
     def __init__(self, config, configs, execution_configs):
         self.config = config
 
@@ -168,6 +215,39 @@ class ExecutionConfig(object):
 
         self.image_types = list(self.image_types)
 
+    def get_dependencies(self, step):
+        """
+        Get the steps of other pipelines that should be completed before
+        running the given step.
+
+        Args:
+            step (Union[str, int]): The stage number or stage 5 phase.
+
+        Returns:
+            List[Tuple[int, Union[str, int]]]:
+                Pairs of config index and event key to wait for.
+        """
+        dependencies = {
+            3: self.stage3_dependencies,
+            "save_core": self.save_core_dependencies,
+            "5_final": self.stage5_final_dependencies,
+            6: self.stage6_dependencies,
+            7: self.stage7_dependencies,
+        }.get(step, [])
+        event_key = self.DEPENDENCY_EVENTS.get(step)
+        return [(dep_index, event_key) for dep_index in dependencies]
+
+    def should_run(self, step):
+        """
+        Whether the given step should be run by this pipeline, or is skipped
+        because it is already handled by another pipeline.
+        """
+        return {
+            "save_core": self.run_save_core,
+            6: self.run_stage6,
+            7: self.run_stage7,
+        }.get(step, True)
+
     def update_dependencies(
         self, config_alter, config_alter_index, execution_config_alter
     ):
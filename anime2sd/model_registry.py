@@ -0,0 +1,169 @@
+import logging
+import threading
+from typing import List, Optional
+
+import timm
+import torch
+from PIL import Image
+
+from waifuc.action import TaggingAction
+from waifuc.model import ImageItem
+from imgutils.detect import detect_person, detect_heads, detect_halfbody
+from imgutils.detect import detect_faces
+from imgutils.metrics import ccip_extract_feature
+
+
+# Models shared by all the pipelines, indexed by (model_name, device)
+_timm_models = {}
+_timm_models_lock = threading.Lock()
+
+
+def get_timm_model(
+    model_name: str,
+    device: str,
+    compile_model: bool = False,
+    logger: Optional[logging.Logger] = None,
+) -> torch.nn.Module:
+    """
+    Get a pretrained timm model in evaluation mode.
+
+    The model is loaded only once per process for each (model_name, device,
+    compile_model) combination and is shared between all the pipelines.
+
+    Args:
+        model_name (str): Name of the timm model.
+        device (str): Device on which the model is put.
+        compile_model (bool):
+            Whether to compile the model with torch.compile. Compilation happens
+            lazily at the first forward pass.
+        logger (Optional[logging.Logger]): Logger for logging information.
+
+    Returns:
+        torch.nn.Module: The loaded model.
+    """
+    if logger is None:
+        logger = logging.getLogger()
+    key = (model_name, device, compile_model)
+    # Hold the lock while loading so that concurrent pipelines
+    # do not load the same model twice
+    with _timm_models_lock:
+        if key not in _timm_models:
+            logger.info(f"Loading {model_name} ...")
+            model = timm.create_model(model_name, pretrained=True).to(device)
+            model.eval()
+            if compile_model:
+                if hasattr(torch, "compile"):
+                    model = torch.compile(model)
+                else:
+                    logger.warning(
+                        "torch.compile is not available, "
+                        f"{model_name} is not compiled."
+                    )
+            _timm_models[key] = model
+        return _timm_models[key]
+
+
+def warmup_timm_model(
+    model_name: str,
+    device: str,
+    compile_model: bool = False,
+    batch_size: int = 1,
+    logger: Optional[logging.Logger] = None,
+) -> None:
+    """
+    Load a timm model and run a forward pass on a dummy input.
+    For compiled models, batch_size should match the one used for inference
+    to avoid recompilation.
+    """
+    model = get_timm_model(
+        model_name, device, compile_model=compile_model, logger=logger
+    )
+    data_cfg = timm.data.resolve_data_config(model.pretrained_cfg)
+    dummy_input = torch.zeros((batch_size, *data_cfg["input_size"]), device=device)
+    with torch.no_grad(), torch.autocast(device_type=device):
+        model(dummy_input)
+
+
+def prewarm_models(configs: List, logger: Optional[logging.Logger] = None) -> None:
+    """
+    Load the models required by the given pipelines and run them once on a dummy
+    image, so that they are not loaded concurrently by different pipelines and
+    the first real stage does not pay the cold start cost.
+
+    The detection, classification and tagging models of imgutils are cached by
+    imgutils itself, so running them once is enough to keep them loaded.
+
+    Args:
+        configs (List[argparse.Namespace]): Configurations of the pipelines.
+        logger (Optional[logging.Logger]): Logger for logging information.
+    """
+    if logger is None:
+        logger = logging.getLogger()
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    duplicate_models = set()
+    person_levels = set()
+    halfbody_levels = set()
+    head_levels = set()
+    face_levels = set()
+    use_ccip = False
+    tagging_methods = set()
+
+    for config in configs:
+        stages = range(config.start_stage, config.end_stage + 1)
+        if (1 in stages and not config.no_remove_similar) or (
+            4 in stages and config.filter_again
+        ):
+            duplicate_models.add(
+                (
+                    config.detect_duplicate_model,
+                    config.detect_duplicate_compile,
+                    config.detect_duplicate_batch_size,
+                )
+            )
+        if 2 in stages:
+            person_levels.add(config.detect_level)
+            if config.use_3stage_crop == 2:
+                if config.detect_level in ["s", "n"]:
+                    level = config.detect_level
+                else:
+                    level = "n"
+                halfbody_levels.add(level)
+                head_levels.add(level)
+            if config.crop_with_head:
+                head_levels.add("n")
+            if config.crop_with_face:
+                face_levels.add("n")
+        if 3 in stages:
+            use_ccip = True
+        if 5 in stages:
+            tagging_methods.add(config.tagging_method)
+
+    if not (duplicate_models or person_levels or use_ccip or tagging_methods):
+        return
+    logger.info("Warming up models ...")
+
+    for model_name, compile_model, batch_size in duplicate_models:
+        warmup_timm_model(
+            model_name,
+            device,
+            compile_model=compile_model,
+            batch_size=batch_size,
+            logger=logger,
+        )
+
+    dummy_image = Image.new("RGB", (64, 64))
+    for level in person_levels:
+        detect_person(dummy_image, level=level)
+    for level in halfbody_levels:
+        detect_halfbody(dummy_image, level=level)
+    for level in head_levels:
+        detect_heads(dummy_image, level=level)
+    for level in face_levels:
+        detect_faces(dummy_image, level=level)
+    if use_ccip:
+        ccip_extract_feature(dummy_image)
+    for tagging_method in tagging_methods:
+        TaggingAction(method=tagging_method, force=True).process(
+            ImageItem(dummy_image, {})
+        )
@@ -103,6 +103,17 @@ def parse_arguments():
             "Defaults to --pipeline_type."
         ),
     )
+    parser.add_argument(
+        "--max_concurrent_gpu_stages",
+        type=int,
+        default=None,
+        help=(
+            "Maximum number of model-heavy stages (1 to 5) that run at the same time "
+            "across the pipelines executed in parallel. "
+            "Only the value from the command line or --base_config_file is used. "
+            "Defaults to None which means no limit."
+        ),
+    )
     parser.add_argument(
         "--remove_intermediate",
         action="store_true",
@@ -291,6 +302,15 @@ def parse_arguments():
         default=16,
         help="Batch size for embendding computation used in duplicate detection",
     )
+    parser.add_argument(
+        "--detect_duplicate_compile",
+        action="store_true",
+        help=(
+            "Compile the duplicate detection model with torch.compile. "
+            "It speeds up embedding computation on large datasets at the cost of "
+            "a longer warmup."
+        ),
+    )
     parser.add_argument(
         "--similar_thresh",
         type=float,
@@ -13,6 +13,7 @@ from torch.utils.data import Dataset
 from torch.utils.data import DataLoader
 
 from .basics import get_related_paths, get_images_recursively
+from .model_registry import get_timm_model
 
 
 class ImageDataset(Dataset):
@@ -129,6 +130,7 @@ class DuplicateRemover(object):
         dataloader_batch_size: int = 16,
         dataloader_num_workers: int = 4,
         pin_memory: bool = True,
+        compile_model: bool = False,
         logger: Optional[logging.Logger] = None,
     ):
         """Initializes the DuplicateRemover object.
@@ -142,6 +144,7 @@ class DuplicateRemover(object):
             dataloader_batch_size (int): Batch size for the DataLoader.
             dataloader_num_workers (int): Number of worker threads for DataLoader.
             pin_memory (bool): Whether to use pinned memory in DataLoader.
+            compile_model (bool): Whether to compile the model with torch.compile.
             logger (logging.Logger): Logger for logging information.
         """
         if logger is None:
@@ -152,9 +155,9 @@ class DuplicateRemover(object):
             self.device = "cuda" if torch.cuda.is_available() else "cpu"
         else:
             self.device = device
-        self.logger.info(f"Loading {model_name} ...")
-        self.model = timm.create_model(model_name, pretrained=True).to(self.device)
-        self.model.eval()
+        self.model = get_timm_model(
+            model_name, self.device, compile_model=compile_model, logger=self.logger
+        )
 
         self.threshold = threshold
         self.max_compare_size = max_compare_size
@@ -185,11 +188,14 @@ class DuplicateRemover(object):
 
         with torch.no_grad(), torch.autocast(device_type=self.device):
             for _, images in tqdm(dataloader):
-                images = images.to(self.device)
+                # Copies from pinned memory are asynchronous and overlap with
+                # the computation on the previous batch
+                images = images.to(self.device, non_blocking=self.pin_memory)
                 features = self.model(images)
-                embeddings.append(features.cpu().float().numpy())
+                # Keep features on device to avoid a synchronization per batch
+                embeddings.append(features)
 
-        return np.vstack(embeddings)
+        return torch.cat(embeddings).cpu().float().numpy()
 
     def get_duplicate(
         self, embeddings: np.ndarray, indices: Optional[np.ndarray] = None
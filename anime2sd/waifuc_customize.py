@@ -1,5 +1,7 @@
 import os
 import re
+import queue
+import threading
 from typing import List, Dict, Tuple, Optional, Iterator, Union
 from PIL import UnidentifiedImageError
 from tqdm import tqdm
@@ -192,6 +194,8 @@ class LocalSource(BaseDataSource):
         load_aux: Optional[List[str]] = None,
         load_grabber_ext: Optional[str] = None,
         progress_bar: bool = True,
+        prefetch: int = 16,
+        image_paths: Optional[List[str]] = None,
     ):
         self.directory = directory
         self.recursive = recursive
@@ -199,12 +203,29 @@ class LocalSource(BaseDataSource):
         self.load_aux = load_aux or []
         self.load_grabber_ext = load_grabber_ext
         self.progress_bar = progress_bar
-        self.total_images = self._count_total_images() if progress_bar else None
-
-    def _count_total_images(self):
-        return sum(1 for _ in self._iter_files())
+        # Maximum number of images loaded ahead in a background thread,
+        # set to 0 to load images in the iterating thread
+        self.prefetch = prefetch
+        # Image paths to use instead of listing the directory
+        if image_paths is not None:
+            self.file_list = [
+                (path, re.sub(r"[\W_]+", "_", os.path.dirname(path)).strip("_"))
+                for path in image_paths
+            ]
+        # The listing used for counting is reused for iteration,
+        # so that the directory is only scanned once
+        elif progress_bar:
+            self.file_list = list(self._list_files())
+        else:
+            self.file_list = None
+        self.total_images = len(self.file_list) if progress_bar else None
 
     def _iter_files(self):
+        if self.file_list is not None:
+            return iter(self.file_list)
+        return self._list_files()
+
+    def _list_files(self):
         image_extensions = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp"}
         if self.recursive:
             for directory, _, files in os.walk(self.directory):
@@ -218,50 +239,98 @@ class LocalSource(BaseDataSource):
                 if os.path.splitext(file)[1].lower() in image_extensions:
                     yield os.path.join(self.directory, file), group_name
 
+    def _load_item(self, file: str, group_name: str) -> Optional[ImageItem]:
+        try:
+            origin_item = ImageItem.load_from_image(file)
+            origin_item.image.load()
+        except UnidentifiedImageError:
+            return None
+
+        meta = origin_item.meta
+        meta["current_path"] = os.path.abspath(file)
+        if "path" not in meta or self.overwrite_path:
+            meta["path"] = meta["current_path"]
+        if "image_size" not in meta:
+            width, height = origin_item.image.size
+            meta["image_size"] = [width, height]
+        if "filename" not in meta:
+            meta["filename"] = os.path.basename(file)
+        if "group_id" not in meta:
+            meta["group_id"] = group_name
+
+        # Load auxiliary data
+        file_basename = os.path.splitext(meta["filename"])[0]
+        for attribute in self.load_aux:
+            aux_file_path = os.path.join(
+                os.path.dirname(file), file_basename + f".{attribute}"
+            )
+            if os.path.exists(aux_file_path):
+                with open(aux_file_path, "r", encoding="utf-8") as f:
+                    content = f.read()
+                    items = []
+                    for item in content.split(","):
+                        item = item.strip()
+                        if item != "":
+                            items.append(item)
+                    meta[attribute] = items
+
+        if self.load_grabber_ext:
+            grabber_file_path = file + self.load_grabber_ext
+            if os.path.exists(grabber_file_path):
+                with open(grabber_file_path, "r", encoding="utf-8") as f:
+                    grabber_info = f.readlines()
+                meta.update(parse_grabber_info(grabber_info))
+
+        return ImageItem(origin_item.image, meta)
+
+    def _prefetch_items(self, item_queue: queue.Queue, stop_event: threading.Event):
+        def put(element):
+            # Time out regularly to stop when the consumer is gone
+            while not stop_event.is_set():
+                try:
+                    item_queue.put(element, timeout=1)
+                    return
+                except queue.Full:
+                    continue
+
+        try:
+            for file, group_name in self._iter_files():
+                if stop_event.is_set():
+                    return
+                item = self._load_item(file, group_name)
+                if item is not None:
+                    put(item)
+        except BaseException as e:
+            put(e)
+        put(None)
+
     def _iter(self) -> Iterator[ImageItem]:
-        for file, group_name in self._iter_files():
-            try:
-                origin_item = ImageItem.load_from_image(file)
-                origin_item.image.load()
-            except UnidentifiedImageError:
-                continue
-
-            meta = origin_item.meta
-            meta["current_path"] = os.path.abspath(file)
-            if "path" not in meta or self.overwrite_path:
-                meta["path"] = meta["current_path"]
-            if "image_size" not in meta:
-                width, height = origin_item.image.size
-                meta["image_size"] = [width, height]
-            if "filename" not in meta:
-                meta["filename"] = os.path.basename(file)
-            if "group_id" not in meta:
-                meta["group_id"] = group_name
-
-            # Load auxiliary data
-            file_basename = os.path.splitext(meta["filename"])[0]
-            for attribute in self.load_aux:
-                aux_file_path = os.path.join(
-                    os.path.dirname(file), file_basename + f".{attribute}"
-                )
-                if os.path.exists(aux_file_path):
-                    with open(aux_file_path, "r", encoding="utf-8") as f:
-                        content = f.read()
-                        items = []
-                        for item in content.split(","):
-                            item = item.strip()
-                            if item != "":
-                                items.append(item)
-                        meta[attribute] = items
-
-            if self.load_grabber_ext:
-                grabber_file_path = file + self.load_grabber_ext
-                if os.path.exists(grabber_file_path):
-                    with open(grabber_file_path, "r", encoding="utf-8") as f:
-                        grabber_info = f.readlines()
-                    meta.update(parse_grabber_info(grabber_info))
-
-            yield ImageItem(origin_item.image, meta)
+        if self.prefetch <= 0:
+            for file, group_name in self._iter_files():
+                item = self._load_item(file, group_name)
+                if item is not None:
+                    yield item
+            return
+
+        # Images are read and decoded in a background thread so that
+        # this overlaps with the processing of the previous images
+        item_queue = queue.Queue(maxsize=self.prefetch)
+        stop_event = threading.Event()
+        thread = threading.Thread(
+            target=self._prefetch_items, args=(item_queue, stop_event), daemon=True
+        )
+        thread.start()
+        try:
+            while True:
+                item = item_queue.get()
+                if item is None:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop_event.set()
+            thread.join()
 
     def _iter_from(self) -> Iterator[ImageItem]:
         desc = self.__class__.__name__
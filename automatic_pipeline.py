@@ -1,7 +1,8 @@
 import os
 import toml
-import copy
 import shutil
+import functools
+import contextlib
 import logging
 import argparse
 from datetime import datetime
@@ -9,11 +10,17 @@ from datetime import datetime
 import asyncio
 import concurrent.futures
 
+try:
+    import tomllib
+except ModuleNotFoundError:
+    # tomllib is only available from Python 3.11
+    tomllib = None
+
 from waifuc.action import PersonSplitAction
 from waifuc.action import MinSizeFilterAction
 from waifuc.action import ThreeStageSplitAction
 
-from anime2sd import rearrange_related_files, load_metadata_from_aux
+from anime2sd import rearrange_related_files_once, load_metadata_from_aux
 from anime2sd import download_animes, download_images
 from anime2sd import extract_and_remove_similar
 from anime2sd import classify_from_directory
@@ -32,14 +39,69 @@ from anime2sd.basics import read_class_mapping
 from anime2sd.execution_ordering import (
     setup_logging,
     get_src_dir,
+    cache_src_dirs,
     get_and_create_dst_dir,
     get_execution_configs,
 )
+from anime2sd.model_registry import prewarm_models
 from anime2sd.parse_arguments import parse_arguments
 from anime2sd.waifuc_customize import LocalSource, SaveExporter
 from anime2sd.waifuc_customize import MinFaceCountAction, MinHeadCountAction
 
 
+# Stages dominated by model inference or image processing. They run on a
+# dedicated executor so that the other stages, which mostly wait on network or
+# file system, are not queued behind them.
+COMPUTE_STAGES = {1, 2, 3, 4, 5}
+
+# Mapping stage numbers to their aliases
+STAGE_ALIASES = {
+    0: ["download"],
+    1: ["extract", "remove_similar", "remove_duplicates"],
+    2: ["crop"],
+    3: ["classify"],
+    4: ["select"],
+    5: ["tag", "caption", "tag_and_caption"],
+    6: ["arrange"],
+    7: ["balance", "compute_multiply"],
+}
+_ALIAS_TO_STAGE = {
+    alias: stage_number
+    for stage_number, aliases in STAGE_ALIASES.items()
+    for alias in aliases
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _load_toml(toml_path: str, mtime: float) -> dict:
+    # mtime is only part of the cache key so that modified files get reloaded
+    if tomllib is not None:
+        with open(toml_path, "rb") as f:
+            return tomllib.load(f)
+    with open(toml_path, "r") as f:
+        return toml.load(f)
+
+
+def load_toml(toml_path: str) -> dict:
+    """
+    Load a TOML file, reusing the parsed content if the file was already loaded
+    and has not been modified since. The returned dictionary should not be modified.
+    """
+    return _load_toml(toml_path, os.path.getmtime(toml_path))
+
+
+def flatten_toml_config(config: dict) -> dict:
+    """Flatten the sections of a TOML configuration into a single dictionary."""
+    flat_config = {}
+    for key, value in config.items():
+        if isinstance(value, dict):
+            # Handle nested sections by flattening them
+            flat_config.update(value)
+        else:
+            flat_config[key] = value
+    return flat_config
+
+
 def update_args_from_toml(
     args: argparse.Namespace, toml_path: str
 ) -> argparse.Namespace:
@@ -63,48 +125,46 @@ def update_args_from_toml(
     Raises:
         Exception: If there is an error in reading or parsing the TOML file.
     """
-    new_args = copy.deepcopy(args)
+    # Arguments are flat and never modified in place so a shallow copy suffices
+    new_args = argparse.Namespace(**vars(args))
     try:
-        with open(toml_path, "r") as f:
-            config = toml.load(f)
-        for key, value in config.items():
-            if isinstance(value, dict):
-                # Handle nested sections by flattening them
-                for nested_key, nested_value in value.items():
-                    if not hasattr(new_args, nested_key):
-                        logging.warning(
-                            f"Key {nested_key} in .toml is not a valid argument."
-                        )
-                    setattr(new_args, nested_key, nested_value)
-            else:
-                if not hasattr(new_args, key):
-                    logging.warning(f"Key {key} in .toml is not a valid argument.")
-                setattr(new_args, key, value)
+        flat_config = flatten_toml_config(load_toml(toml_path))
+        for key in flat_config:
+            if not hasattr(new_args, key):
+                logging.warning(f"Key {key} in .toml is not a valid argument.")
+        vars(new_args).update(flat_config)
     except Exception as e:
         print(f"Error loading config from {toml_path}: {e}")
     return new_args
 
 
+def parse_stage(stage):
+    """
+    Converts a stage number or alias to the corresponding stage number.
+    """
+    stage = _ALIAS_TO_STAGE.get(stage, stage)
+    try:
+        stage_number = int(stage)
+    except (TypeError, ValueError):
+        stage_number = None
+    if stage_number not in STAGE_ALIASES:
+        raise ValueError(
+            f"Invalid stage {stage!r}, expected a number between "
+            f"{min(STAGE_ALIASES)} and {max(STAGE_ALIASES)} or one of "
+            f"{sorted(_ALIAS_TO_STAGE)}"
+        )
+    return stage_number
+
+
 def setup_args(args):
     """
     Sets up the start and end stages for the pipeline based on the provided arguments.
     """
-    # Mapping stage numbers to their aliases
-    STAGE_ALIASES = {
-        0: ["download"],
-        1: ["extract", "remove_similar", "remove_duplicates"],
-        2: ["crop"],
-        3: ["classify"],
-        4: ["select"],
-        5: ["tag", "caption", "tag_and_caption"],
-        6: ["arrange"],
-        7: ["balance", "compute_multiply"],
-    }
     if not args.anime_name_booru:
         args.anime_name_booru = args.anime_name
     if not args.image_type:
         args.image_type = args.pipeline_type
-    if not config.log_prefix:
+    if not args.log_prefix:
         if args.anime_name:
             args.log_prefix = args.anime_name
         else:
@@ -112,18 +172,10 @@ def setup_args(args):
     if not args.keep_tokens_sep:
         args.keep_tokens_sep = args.caption_outer_sep
 
-    start_stage = args.start_stage
-    end_stage = args.end_stage
+    args.start_stage = parse_stage(args.start_stage)
+    args.end_stage = parse_stage(args.end_stage)
 
-    # Convert stage aliases to numbers if provided
-    for stage_number in STAGE_ALIASES:
-        if args.start_stage in STAGE_ALIASES[stage_number]:
-            start_stage = stage_number
-        if args.end_stage in STAGE_ALIASES[stage_number]:
-            end_stage = stage_number
-
-    args.start_stage = int(start_stage)
-    args.end_stage = int(end_stage)
+    cache_src_dirs(args)
 
 
 def download(args, stage, logger):
@@ -192,6 +244,7 @@ def extract_frames_and_or_remove_similar(args, stage, logger):
             args.detect_duplicate_model,
             threshold=args.similar_thresh,
             dataloader_batch_size=args.detect_duplicate_batch_size,
+            compile_model=args.detect_duplicate_compile,
             logger=logger,
         )
 
@@ -315,6 +368,7 @@ def select_dataset_images(args, stage, logger):
             args.detect_duplicate_model,
             threshold=args.similar_thresh,
             dataloader_batch_size=args.detect_duplicate_batch_size,
+            compile_model=args.detect_duplicate_compile,
             logger=logger,
         )
     else:
@@ -349,12 +403,29 @@ def select_dataset_images(args, stage, logger):
         logger=logger,
     )
 
-    if args.remove_intermediate:
-        shutil.rmtree(classified_dir)
+    # The intermediate classified directory is removed in background
+    # by run_pipeline if args.remove_intermediate is set
+
+
+async def wait_for_dependencies(step, execution_config, stage_events):
+    """Wait for the events of other pipelines that the given step depends on."""
+    await asyncio.gather(
+        *(
+            stage_events[dep_index][event_key].wait()
+            for dep_index, event_key in execution_config.get_dependencies(step)
+        )
+    )
 
 
 async def tag_and_caption(
-    args, stage, config_index, execution_config, stage_events, executor, logger
+    args,
+    stage,
+    config_index,
+    execution_config,
+    stage_events,
+    executor,
+    gpu_semaphore,
+    logger,
 ):
     """
     Perform in-place tagging and captioning.
@@ -415,27 +486,25 @@ async def tag_and_caption(
 
     loop = asyncio.get_running_loop()
 
-    await loop.run_in_executor(
-        executor,
-        tag_and_caption_from_directory,
-        src_dir,
-        tagging_manager,
-        caption_generator,
-        args.save_aux,
-        logger,
-    )
+    # Only hold the semaphore while tagging, as other phases may wait for
+    # other pipelines
+    async with gpu_semaphore:
+        image_paths = await loop.run_in_executor(
+            executor,
+            tag_and_caption_from_directory,
+            src_dir,
+            tagging_manager,
+            caption_generator,
+            args.save_aux,
+            logger,
+        )
     stage_events[config_index]["5_phase1"].set()
 
     core_tag_dir = get_src_dir(args, "core_tag")
     core_tag_path = os.path.join(core_tag_dir, "core_tag.json")
 
-    if execution_config.run_save_core:
-        await asyncio.gather(
-            *(
-                stage_events[dep_index]["5_phase1"].wait()
-                for dep_index in execution_config.save_core_dependencies
-            )
-        )
+    if execution_config.should_run("save_core"):
+        await wait_for_dependencies("save_core", execution_config, stage_events)
         # Do not use character tag processor for computing core tags
         # in mode "character" as this causes classification into different types
         if args.prune_mode == "character":
@@ -456,12 +525,7 @@ async def tag_and_caption(
     stage_events[config_index]["save_core"].set()
 
     if args.prune_mode == "character_core":
-        await asyncio.gather(
-            *(
-                stage_events[dep_index]["save_core"].wait()
-                for dep_index in execution_config.stage5_final_dependencies
-            )
-        )
+        await wait_for_dependencies("5_final", execution_config, stage_events)
         await loop.run_in_executor(
             executor,
             tag_and_caption_from_directory_core_final,
@@ -470,6 +534,8 @@ async def tag_and_caption(
             tagging_manager,
             caption_generator,
             args.save_aux,
+            # Images are unchanged since the first phase
+            image_paths,
             logger,
         )
 
@@ -518,7 +584,7 @@ def balance(args, stage, logger):
 
 def common_preprocess(args, logger):
     """Common preprocessing at the beginning of the pipeline."""
-    rearrange_related_files(args.src_dir, logger)
+    rearrange_related_files_once(args.src_dir, logger)
     if args.load_grabber_ext or args.load_aux or args.overwrite_path:
         if args.character_info_file and os.path.exists(args.character_info_file):
             character_mapping = read_class_mapping(args.character_info_file)
@@ -534,6 +600,12 @@ def common_preprocess(args, logger):
         )
 
 
+def remove_intermediate_dir(dir, logger):
+    """Remove an intermediate directory that is no longer needed."""
+    logger.info(f"Removing {dir} ...")
+    shutil.rmtree(dir)
+
+
 def run_stage(config, stage_num, logger):
     # Mapping stage numbers to their respective function names
     STAGE_FUNCTIONS = {
@@ -550,7 +622,16 @@ def run_stage(config, stage_num, logger):
     STAGE_FUNCTIONS[stage_num](config, stage_num, logger)
 
 
-async def run_pipeline(config, config_index, execution_config, stage_events, executor):
+async def run_pipeline(
+    config,
+    config_index,
+    execution_config,
+    stage_events,
+    compute_executor,
+    io_executor,
+    gpu_semaphore,
+    background_tasks,
+):
     logger = setup_logging(
         config.log_dir,
         f"{config.image_type}_{config.log_prefix}",
@@ -558,44 +639,22 @@ async def run_pipeline(config, config_index, execution_config, stage_events, exe
     )
 
     # Rearranging related files from multiple threads could be problematic if
-    # the folders have overlap. We assume this is not the case.
+    # the folders have overlap. We assume this is not the case, except for
+    # identical folders which are only rearranged once.
     if config.start_stage >= 1:
         loop = asyncio.get_running_loop()
         logger.info(f"-------------Preprocessing {config.src_dir}-------------")
-        await loop.run_in_executor(executor, common_preprocess, config, logger)
+        await loop.run_in_executor(io_executor, common_preprocess, config, logger)
 
     # Loop through the stages and execute them
     for stage_num in range(config.start_stage, config.end_stage + 1):
-        if stage_num == 3:
-            # Wait for dependent booru configs to complete classification
-            await asyncio.gather(
-                *(
-                    stage_events[dep_index][3].wait()
-                    for dep_index in execution_config.stage3_dependencies
-                )
-            )
-        if stage_num == 6:
-            if not execution_config.run_stage6:
-                stage_events[config_index][stage_num].set()
-                continue
-            # Wait for dependent configs to complete tagging
-            await asyncio.gather(
-                *(
-                    stage_events[dep_index][5].wait()
-                    for dep_index in execution_config.stage6_dependencies
-                )
-            )
-        if stage_num == 7:
-            if not execution_config.run_stage7:
-                stage_events[config_index][stage_num].set()
-                continue
-            # Wait for dependent configs to complete rearranging
-            await asyncio.gather(
-                *(
-                    stage_events[dep_index][6].wait()
-                    for dep_index in execution_config.stage7_dependencies
-                )
-            )
+        # Skip stages that are taken care of by other pipelines
+        if not execution_config.should_run(stage_num):
+            stage_events[config_index][stage_num].set()
+            continue
+        # Wait for the stages of other pipelines this stage depends on,
+        # e.g. booru classification that supplements reference images for stage 3
+        await wait_for_dependencies(stage_num, execution_config, stage_events)
 
         loop = asyncio.get_running_loop()
 
@@ -607,15 +666,46 @@ async def run_pipeline(config, config_index, execution_config, stage_events, exe
                 config_index,
                 execution_config,
                 stage_events,
-                executor,
+                compute_executor,
+                gpu_semaphore,
                 logger,
             )
+        elif stage_num in COMPUTE_STAGES:
+            async with gpu_semaphore:
+                await loop.run_in_executor(
+                    compute_executor, run_stage, config, stage_num, logger
+                )
         else:
-            await loop.run_in_executor(executor, run_stage, config, stage_num, logger)
+            await loop.run_in_executor(
+                io_executor, run_stage, config, stage_num, logger
+            )
         stage_events[config_index][stage_num].set()
 
+        if stage_num == 4 and config.remove_intermediate:
+            # Do not block the next stages while removing classified images
+            classified_dir = os.path.join(get_src_dir(config, stage_num), "classified")
+            background_tasks.append(
+                loop.run_in_executor(
+                    io_executor, remove_intermediate_dir, classified_dir, logger
+                )
+            )
+
 
-async def main(configs):
+async def gather_or_cancel(*coros):
+    """
+    Run coroutines concurrently. If one of them fails, cancel the others
+    and raise its exception.
+    """
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    for task in done:
+        task.result()
+
+
+async def main(configs, max_concurrent_gpu_stages=None):
     # Set up configs for execution dependencies and optional skips
     execution_configs = get_execution_configs(configs)
 
@@ -631,13 +721,39 @@ async def main(configs):
             events["save_core"] = asyncio.Event()
         stage_events.append(events)
 
-    # Create a ThreadPoolExecutor
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        # Run pipelines asynchronously with dependencies
-        await asyncio.gather(
+    # Thread pools are used rather than process pools because stage functions
+    # share loggers and loaded models, and the heavy parts release the GIL
+    with concurrent.futures.ThreadPoolExecutor(
+        thread_name_prefix="compute"
+    ) as compute_executor, concurrent.futures.ThreadPoolExecutor(
+        thread_name_prefix="io"
+    ) as io_executor:
+        # Load the models shared by the pipelines once before starting
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(compute_executor, prewarm_models, configs)
+
+        # Limit the number of model-heavy stages running at the same time
+        if max_concurrent_gpu_stages:
+            gpu_semaphore = asyncio.Semaphore(max_concurrent_gpu_stages)
+        else:
+            gpu_semaphore = contextlib.nullcontext()
+
+        # Tasks such as cleanup that run in background of the pipelines
+        background_tasks = []
+
+        # Run pipelines asynchronously with dependencies, stopping all of them
+        # if one fails
+        await gather_or_cancel(
             *(
                 run_pipeline(
-                    config, config_index, execution_config, stage_events, executor
+                    config,
+                    config_index,
+                    execution_config,
+                    stage_events,
+                    compute_executor,
+                    io_executor,
+                    gpu_semaphore,
+                    background_tasks,
                 )
                 for config_index, (config, execution_config) in enumerate(
                     zip(configs, execution_configs)
@@ -645,6 +761,12 @@ async def main(configs):
             )
         )
 
+        # Wait for background tasks and report their failures
+        results = await asyncio.gather(*background_tasks, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logging.error(f"Background task failed: {result}")
+
 
 if __name__ == "__main__":
     args, explicit_args = parse_arguments()
@@ -653,24 +775,19 @@ if __name__ == "__main__":
         args = update_args_from_toml(args, args.base_config_file)
 
     configs = []
-    if args.config_file:
-        for toml_path in args.config_file:
-            config_args = update_args_from_toml(args, toml_path)
-            configs.append(config_args)
-    else:
-        configs.append(args)
-
-    if args.base_config_file or args.config_file:
-        # Overwrite args with explicitly set command line arguments
-        for config in configs:
-            for key, value in explicit_args.items():
-                setattr(config, key, value)
-
     # A set to record dst_dir and image_type in configs
     dst_folder_set = set()
 
-    # Process each configuration
-    for config in configs:
+    # Build and set up each configuration in a single pass
+    for toml_path in args.config_file or [None]:
+        if toml_path is None:
+            config = args
+        else:
+            config = update_args_from_toml(args, toml_path)
+        if args.base_config_file or args.config_file:
+            # Overwrite args with explicitly set command line arguments
+            vars(config).update(explicit_args)
+
         setup_args(config)
         dst_folder = (config.dst_dir, config.extra_path_component, config.image_type)
         if dst_folder in dst_folder_set:
@@ -680,6 +797,7 @@ if __name__ == "__main__":
                 f"{config.dst_dir}, {config.extra_path_component}, {config.image_type}"
             )
         dst_folder_set.add(dst_folder)
+        configs.append(config)
 
     logging.getLogger().setLevel(logging.INFO)
-    asyncio.run(main(configs))
+    asyncio.run(main(configs, args.max_concurrent_gpu_stages))